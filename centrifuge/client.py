@@ -1,20 +1,22 @@
 import asyncio
-import base64
 import contextlib
+import itertools
 import logging
 from asyncio import TimerHandle
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from operator import itemgetter
 from enum import Enum
 from typing import (
     TYPE_CHECKING,
     Any,
     Awaitable,
     Dict,
+    Iterable,
     Optional,
     Union,
     List,
     Callable,
+    Tuple,
 )
 
 import websockets
@@ -70,10 +72,11 @@ from centrifuge.types import (
 )
 from centrifuge.utils import (
     _backoff,
+    _close_code_to_disconnect,
     _code_message,
     _code_number,
     _is_token_expired,
-    _wait_for_future,
+    _should_reconnect,
 )
 
 if TYPE_CHECKING:
@@ -81,6 +84,22 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger("centrifuge")
 
+# Code numbers and messages used on error and disconnect paths, computed once.
+_ERR_CLIENT_CONNECT_TOKEN_NUM = _code_number(_ErrorCode.CLIENT_CONNECT_TOKEN)
+_ERR_CLIENT_REFRESH_TOKEN_NUM = _code_number(_ErrorCode.CLIENT_REFRESH_TOKEN)
+_ERR_CONNECT_REPLY_ERROR_NUM = _code_number(_ErrorCode.CONNECT_REPLY_ERROR)
+_ERR_SUBSCRIBE_REPLY_ERROR_NUM = _code_number(_ErrorCode.SUBSCRIBE_REPLY_ERROR)
+_ERR_SUBSCRIPTION_REFRESH_TOKEN_NUM = _code_number(_ErrorCode.SUBSCRIPTION_REFRESH_TOKEN)
+_ERR_SUBSCRIPTION_SUBSCRIBE_TOKEN_NUM = _code_number(_ErrorCode.SUBSCRIPTION_SUBSCRIBE_TOKEN)
+_ERR_TIMEOUT_NUM = _code_number(_ErrorCode.TIMEOUT)
+_ERR_TRANSPORT_CLOSED_NUM = _code_number(_ErrorCode.TRANSPORT_CLOSED)
+_TRANSPORT_CLOSED_NUM = _code_number(_ConnectingCode.TRANSPORT_CLOSED)
+_TRANSPORT_CLOSED_MSG = _code_message(_ConnectingCode.TRANSPORT_CLOSED)
+_SUB_TRANSPORT_CLOSED_NUM = _code_number(_SubscribingCode.TRANSPORT_CLOSED)
+_SUB_TRANSPORT_CLOSED_MSG = _code_message(_SubscribingCode.TRANSPORT_CLOSED)
+
+_get_code_reason = itemgetter("code", "reason")
+
 
 class ClientState(Enum):
     """ClientState represents possible states of client connection."""
@@ -98,11 +117,26 @@ class SubscriptionState(Enum):
     SUBSCRIBED = "subscribed"
 
 
-@dataclass
+def _build_publication(
+    pub: Dict[str, Any],
+    decode_data: Callable[[Any], Any],
+    extract_client_info: Callable[[Any], ClientInfo],
+) -> Publication:
+    pub_get = pub.get
+    info = pub_get("info")
+    return Publication(
+        offset=pub_get("offset", 0),
+        data=decode_data(pub_get("data")),
+        info=extract_client_info(info) if info else None,
+    )
+
+
 class _Callback:
-    future: asyncio.Future
-    done: Optional[asyncio.Future]
-    timeout: Optional[asyncio.TimerHandle]
+    __slots__ = ("future", "done")
+
+    def __init__(self, future: asyncio.Future, done: Optional[asyncio.Future]) -> None:
+        self.future = future
+        self.done = done
 
 
 class Client:
@@ -110,6 +144,16 @@ class Client:
 
     _reconnect_backoff_factor = 2
     _reconnect_backoff_jitter = 0.5
+    # Max number of commands sent to server in one WebSocket frame.
+    _max_batch_size = 64
+    # Command timeouts are tracked with a timing wheel: number of slots and slot duration.
+    _timeout_wheel_size = 256
+    _timeout_resolution = 0.1
+    # Incoming frames larger than this (in bytes or characters) are decoded in the default
+    # executor if codec supports it (Protobuf), so other tasks get a chance to run while
+    # a large frame is decoded. Smaller frames are decoded inline as handing them off
+    # to a thread costs more than decoding.
+    _decode_in_executor_size = 16 * 1024
 
     def __init__(
         self,
@@ -139,16 +183,18 @@ class Client:
         self.state: ClientState = ClientState.DISCONNECTED
         self._address = address
         self._events = events or ConnectionEventHandler()
-        self._use_protobuf = use_protobuf
         self._codec: Union[
             _ProtobufCodec,
             _JsonCodec,
         ] = _ProtobufCodec() if use_protobuf else _JsonCodec()
+        # Payload encoding depends on protocol only, so bind codec implementations once.
+        self._decode_data = self._codec.decode_data
+        self._encode_data = self._codec.encode_data
         self._conn: Optional["WebSocketClientProtocol"] = None
-        self._id: int = 0
+        self._next_command_id = itertools.count(1).__next__
         self._subs: Dict[str, Subscription] = {}
-        self._messages = asyncio.Queue()
-        self._delay = 0
+        # Subset of _subs in SUBSCRIBED state, maintained by Subscription state transitions.
+        self._subscribed_subs: Dict[str, Subscription] = {}
         self._need_reconnect = True
         self._name = name
         self._version = version
@@ -159,17 +205,32 @@ class Client:
         self._send_pong = True
         self._ping_interval = 0
         self._max_server_ping_delay = max_server_ping_delay
+        # Time to wait for the next server ping, updated on every connect.
+        self._ping_wait_delay = max_server_ping_delay
         self._ping_timer = None
         self._refresh_timer = None
-        # Optimistically keep future unresolved for newly created instance
+        self._loop = loop or asyncio.get_event_loop()
+        # Optimistically keep event unset for newly created instance
         # despite Client is in DISCONNECTED state.
-        self._connected_future = asyncio.Future()
+        self._connected_event = asyncio.Event()
         self._token = token
         self._get_token = get_token
-        self._loop = loop or asyncio.get_event_loop()
         self._futures: Dict[int, _Callback] = {}
+        self._timeout_wheel: List[List[Tuple[float, int]]] = [
+            [] for _ in range(self._timeout_wheel_size)
+        ]
+        self._timeout_tick = 0
+        self._timeout_timer: Optional[TimerHandle] = None
         self._reconnect_attempts = 0
         self._reconnect_timer = None
+        self._write_queue: asyncio.Queue = asyncio.Queue()
+        # Channel-scoped push handlers, keyed by push type.
+        self._push_handlers: Dict[str, Callable[[str, Any], Awaitable[None]]] = {
+            "pub": self._process_publication,
+            "join": self._process_join,
+            "leave": self._process_leave,
+            "unsubscribe": self._process_unsubscribe,
+        }
 
     def subscriptions(self) -> Dict[str, "Subscription"]:
         """Returns a copy of subscriptions dict."""
@@ -224,6 +285,28 @@ class Client:
         sub._client = None
         del self._subs[sub.channel]
 
+    async def unsubscribe_all(self, channels: Iterable[str]) -> None:
+        """Unsubscribes from several channels at once. Unsubscribe commands are sent
+        to server together instead of waiting for a reply to each one in turn. Channels
+        without subscription in registry are skipped, repeated channels are unsubscribed once:
+
+            await client.unsubscribe_all(["news", "chat"])
+        """
+        subs = {}
+        for channel in channels:
+            sub = self._subs.get(channel)
+            if sub and sub.state != SubscriptionState.UNSUBSCRIBED:
+                subs[channel] = sub
+        if not subs:
+            return
+
+        code = _UnsubscribedCode.UNSUBSCRIBE_CALLED
+        code_number, code_message = _code_number(code), _code_message(code)
+        await asyncio.gather(
+            *[sub._move_unsubscribed(code_number, code_message) for sub in subs.values()],
+        )
+        await self._unsubscribe_many(list(subs))
+
     async def _close_transport_conn(self) -> None:
         if not self._conn:
             return
@@ -249,36 +332,31 @@ class Client:
             self._max_reconnect_delay,
         )
         self._reconnect_attempts += 1
-        logger.debug("start reconnecting in %f", delay)
-        self._reconnect_timer = self._loop.call_later(
-            delay,
-            lambda: asyncio.ensure_future(self._reconnect()),
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("start reconnecting in %f", delay)
+        self._reconnect_timer = self._loop.call_later(delay, self._launch_reconnect)
+
+    def _launch_reconnect(self) -> None:
+        self._loop.create_task(self._reconnect())
 
     async def _reconnect(self) -> None:
         if self.state != ClientState.CONNECTING:
             return
         await self._create_connection()
 
-    def _next_command_id(self) -> int:
-        self._id += 1
-        return self._id
-
     async def _create_connection(self) -> bool:
         if self.state != ClientState.CONNECTING:
             return False
-        subprotocols = []
-        if self._use_protobuf:
-            subprotocols = ["centrifuge-protobuf"]
         try:
-            self._conn = await websockets.connect(self._address, subprotocols=subprotocols)
+            self._conn = await websockets.connect(
+                self._address, subprotocols=self._codec.subprotocols
+            )
         except OSError as e:
             handler = self._events.on_error
-            await handler(ErrorContext(code=_code_number(_ErrorCode.TRANSPORT_CLOSED), error=e))
+            await handler(ErrorContext(code=_ERR_TRANSPORT_CLOSED_NUM, error=e))
             asyncio.ensure_future(self._schedule_reconnect())
             return False
 
-        self._delay = self._min_reconnect_delay
         connect = {}
 
         if self._token:
@@ -294,7 +372,7 @@ class Client:
                 await self._close_transport_conn()
                 handler = self._events.on_error
                 await handler(
-                    ErrorContext(code=_code_number(_ErrorCode.CLIENT_CONNECT_TOKEN), error=e),
+                    ErrorContext(code=_ERR_CLIENT_CONNECT_TOKEN_NUM, error=e),
                 )
                 asyncio.ensure_future(self._schedule_reconnect())
                 return False
@@ -305,8 +383,10 @@ class Client:
         if self.state != ClientState.CONNECTING:
             return False
 
+        # Each connection gets its own write queue, commands put to the queue of previous
+        # connection (or while client was not connected) are never sent.
+        self._write_queue = asyncio.Queue()
         asyncio.ensure_future(self._listen())
-        asyncio.ensure_future(self._process_messages())
 
         cmd_id = self._next_command_id()
         command = {
@@ -314,14 +394,16 @@ class Client:
             "connect": connect,
         }
         async with self._register_future_with_done(cmd_id, self._timeout) as future:
-            await self._send_commands([command])
-
             try:
+                # Connect must be the first frame of connection, so it is sent directly
+                # and writer starts only after that.
+                await self._send_commands([(cmd_id, self._codec.encode_command(command))])
+                asyncio.ensure_future(self._writer_loop(self._write_queue))
                 reply = await future
             except OperationTimeoutError as e:
                 await self._close_transport_conn()
                 handler = self._events.on_error
-                await handler(ErrorContext(code=_code_number(_ErrorCode.TIMEOUT), error=e))
+                await handler(ErrorContext(code=_ERR_TIMEOUT_NUM, error=e))
                 await self._schedule_reconnect()
                 return False
             except Exception as e:
@@ -332,7 +414,7 @@ class Client:
                 handler = self._events.on_error
                 # TODO: think on better error code here.
                 await handler(
-                    ErrorContext(code=_code_number(_ErrorCode.TRANSPORT_CLOSED), error=e),
+                    ErrorContext(code=_ERR_TRANSPORT_CLOSED_NUM, error=e),
                 )
                 await self._schedule_reconnect()
                 return False
@@ -341,7 +423,8 @@ class Client:
                 return False
 
             if reply.get("error"):
-                logger.debug("connect reply has error: %s", reply.get("error"))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("connect reply has error: %s", reply.get("error"))
                 code, message, temporary = self._extract_error_details(reply)
                 if _is_token_expired(code):
                     temporary = True
@@ -351,7 +434,7 @@ class Client:
                     handler = self._events.on_error
                     await handler(
                         ErrorContext(
-                            code=_code_number(_ErrorCode.CONNECT_REPLY_ERROR),
+                            code=_ERR_CONNECT_REPLY_ERROR_NUM,
                             error=ReplyError(code, message, temporary),
                         ),
                     )
@@ -367,17 +450,15 @@ class Client:
                 self._send_pong = connect.get("pong", False)
                 self._ping_interval = connect.get("ping", 0)
                 if self._ping_interval > 0:
+                    self._ping_wait_delay = self._ping_interval + self._max_server_ping_delay
                     self._restart_ping_wait()
 
                 expires = connect.get("expires", False)
                 if expires:
                     ttl = connect["ttl"]
-                    self._refresh_timer = self._loop.call_later(
-                        ttl,
-                        lambda: asyncio.ensure_future(self._refresh(), loop=self._loop),
-                    )
+                    self._refresh_timer = self._loop.call_later(ttl, self._launch_refresh)
 
-                self._connected_future.set_result(True)
+                self._connected_event.set()
 
                 handler = self._events.on_connected
                 await handler(
@@ -390,12 +471,11 @@ class Client:
 
                 self._clear_connecting_state()
 
-                channels = self._subs.keys()
-                for channel in channels:
-                    sub = self._subs[channel]
-                    if not sub or sub.state != SubscriptionState.SUBSCRIBING:
-                        continue
-                    asyncio.ensure_future(self._subscribe(channel))
+                # Every subscription is sent as soon as its token is ready, the write queue
+                # still packs commands that are ready together into one frame.
+                for sub in self._subs.values():
+                    if sub.state == SubscriptionState.SUBSCRIBING:
+                        asyncio.ensure_future(self._subscribe(sub.channel))
 
     def _clear_connecting_state(self) -> None:
         self._reconnect_attempts = 0
@@ -410,8 +490,7 @@ class Client:
             return
 
         self.state = ClientState.CONNECTING
-        if self._connected_future.done():
-            self._connected_future = asyncio.Future()
+        self._connected_event.clear()
 
         handler = self._events.on_connecting
         code = _ConnectingCode.CONNECT_CALLED
@@ -426,6 +505,9 @@ class Client:
         code = _DisconnectedCode.DISCONNECT_CALLED
         await self._disconnect(_code_number(code), _code_message(code), False)
 
+    def _launch_refresh(self) -> None:
+        self._loop.create_task(self._refresh())
+
     async def _refresh(self) -> None:
         cmd_id = self._next_command_id()
 
@@ -438,26 +520,20 @@ class Client:
                 return
             handler = self._events.on_error
             await handler(
-                ErrorContext(code=_code_number(_ErrorCode.CLIENT_REFRESH_TOKEN), error=e),
+                ErrorContext(code=_ERR_CLIENT_REFRESH_TOKEN_NUM, error=e),
             )
             return
 
         self._token = token
-        command = {
-            "id": cmd_id,
-            "refresh": {
-                "token": token,
-            },
-        }
-        future = self._register_future(cmd_id, self._timeout)
-        await self._send_commands([command])
+        command = self._codec.refresh_command(cmd_id, token)
+        future = self._queue_command(cmd_id, command, self._timeout)
 
         try:
             reply = await future
         except Exception as e:
             handler = self._events.on_error
             await handler(
-                ErrorContext(code=_code_number(_ErrorCode.CLIENT_REFRESH_TOKEN), error=e),
+                ErrorContext(code=_ERR_CLIENT_REFRESH_TOKEN_NUM, error=e),
             )
             return
 
@@ -466,7 +542,7 @@ class Client:
             handler = self._events.on_error
             await handler(
                 ErrorContext(
-                    code=_code_number(_ErrorCode.CLIENT_REFRESH_TOKEN),
+                    code=_ERR_CLIENT_REFRESH_TOKEN_NUM,
                     error=ReplyError(code, message, temporary),
                 ),
             )
@@ -476,10 +552,7 @@ class Client:
         expires = refresh.get("expires", False)
         if expires:
             ttl = refresh["ttl"]
-            self._refresh_timer = self._loop.call_later(
-                ttl,
-                lambda: asyncio.ensure_future(self._refresh(), loop=self._loop),
-            )
+            self._refresh_timer = self._loop.call_later(ttl, self._launch_refresh)
 
     async def _sub_refresh(self, channel: str):
         sub = self._subs.get(channel)
@@ -500,7 +573,7 @@ class Client:
             handler = sub._events.on_error
             await handler(
                 SubscriptionErrorContext(
-                    code=_code_number(_ErrorCode.SUBSCRIPTION_SUBSCRIBE_TOKEN),
+                    code=_ERR_SUBSCRIPTION_SUBSCRIBE_TOKEN_NUM,
                     error=e,
                 ),
             )
@@ -509,15 +582,9 @@ class Client:
 
         cmd_id = self._next_command_id()
         sub._token = token
-        command = {
-            "id": cmd_id,
-            "sub_refresh": {
-                "token": token,
-            },
-        }
+        command = self._codec.sub_refresh_command(cmd_id, channel, token)
 
-        future = self._register_future(cmd_id, self._timeout)
-        await self._send_commands([command])
+        future = self._queue_command(cmd_id, command, self._timeout)
 
         try:
             reply = await future
@@ -525,7 +592,7 @@ class Client:
             handler = sub._events.on_error
             await handler(
                 SubscriptionErrorContext(
-                    code=_code_number(_ErrorCode.SUBSCRIPTION_REFRESH_TOKEN),
+                    code=_ERR_SUBSCRIPTION_REFRESH_TOKEN_NUM,
                     error=e,
                 ),
             )
@@ -536,7 +603,7 @@ class Client:
             handler = sub._events.on_error
             await handler(
                 SubscriptionErrorContext(
-                    code=_code_number(_ErrorCode.SUBSCRIPTION_REFRESH_TOKEN),
+                    code=_ERR_SUBSCRIPTION_REFRESH_TOKEN_NUM,
                     error=ReplyError(code, message, temporary),
                 ),
             )
@@ -546,10 +613,7 @@ class Client:
         expires = sub_refresh.get("expires", False)
         if expires:
             ttl = sub_refresh["ttl"]
-            sub._refresh_timer = self._loop.call_later(
-                ttl,
-                lambda: asyncio.ensure_future(sub._refresh(), loop=self._loop),
-            )
+            sub._refresh_timer = self._loop.call_later(ttl, sub._launch_refresh)
 
     @staticmethod
     def _extract_error_details(reply):
@@ -562,16 +626,14 @@ class Client:
             return None
 
         if self.state != ClientState.CONNECTED:
-            logger.debug("skip subscribe to %s until connected", channel)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("skip subscribe to %s until connected", channel)
             return None
 
-        logger.debug("subscribe to channel %s", channel)
-
-        subscribe = {"channel": channel}
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("subscribe to channel %s", channel)
 
-        if sub._token != "":
-            subscribe["token"] = sub._token
-        elif sub._get_token:
+        if not sub._token and sub._get_token:
             try:
                 token = await sub._get_token(SubscriptionTokenContext(channel=channel))
             except Exception as e:
@@ -582,7 +644,7 @@ class Client:
                 handler = sub._events.on_error
                 await handler(
                     SubscriptionErrorContext(
-                        code=_code_number(_ErrorCode.SUBSCRIPTION_SUBSCRIBE_TOKEN),
+                        code=_ERR_SUBSCRIPTION_SUBSCRIBE_TOKEN_NUM,
                         error=e,
                     ),
                 )
@@ -590,15 +652,12 @@ class Client:
                 return False
 
             sub._token = token
-            subscribe["token"] = token
 
         cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "subscribe": subscribe,
-        }
+        command = self._codec.subscribe_command(cmd_id, channel, sub._token)
+        data = self._codec.encode_command(command)
         async with self._register_future_with_done(cmd_id, self._timeout) as future:
-            await self._send_commands([command])
+            self._put_command(cmd_id, data)
             try:
                 reply = await future
             except OperationTimeoutError as e:
@@ -606,7 +665,7 @@ class Client:
                     return None
                 handler = sub._events.on_error
                 await handler(
-                    SubscriptionErrorContext(code=_code_number(_ErrorCode.TIMEOUT), error=e),
+                    SubscriptionErrorContext(code=_ERR_TIMEOUT_NUM, error=e),
                 )
                 await sub._schedule_resubscribe()
                 return None
@@ -618,7 +677,7 @@ class Client:
                 # TODO: think on better error code here.
                 await handler(
                     SubscriptionErrorContext(
-                        code=_code_number(_ErrorCode.TRANSPORT_CLOSED),
+                        code=_ERR_TRANSPORT_CLOSED_NUM,
                         error=e,
                     ),
                 )
@@ -629,7 +688,8 @@ class Client:
                 return None
 
             if reply.get("error"):
-                logger.debug("subscribe reply has error: %s", reply.get("error"))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("subscribe reply has error: %s", reply.get("error"))
                 code, message, temporary = self._extract_error_details(reply)
                 if _is_token_expired(code):
                     temporary = True
@@ -638,7 +698,7 @@ class Client:
                     handler = sub._events.on_error
                     await handler(
                         SubscriptionErrorContext(
-                            code=_code_number(_ErrorCode.SUBSCRIBE_REPLY_ERROR),
+                            code=_ERR_SUBSCRIBE_REPLY_ERROR_NUM,
                             error=ReplyError(code, message, temporary),
                         ),
                     )
@@ -653,44 +713,60 @@ class Client:
         asyncio.ensure_future(self._subscribe(sub.channel))
 
     async def _unsubscribe(self, channel: str):
-        sub = self._subs.get(channel, None)
-        if not sub:
-            return
+        await self._unsubscribe_many([channel])
 
-        unsubscribe = {"channel": sub.channel}
-
-        cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "unsubscribe": unsubscribe,
-        }
-        future = self._register_future(cmd_id, self._timeout)
+    async def _unsubscribe_many(self, channels: List[str]) -> None:
+        if self.state != ClientState.CONNECTED:
+            return
 
-        await self._send_commands([command])
+        futures = []
+        for channel in channels:
+            if channel not in self._subs:
+                continue
+            cmd_id = self._next_command_id()
+            command = self._codec.unsubscribe_command(cmd_id, channel)
+            futures.append(self._queue_command(cmd_id, command, self._timeout))
+        if not futures:
+            return
 
-        try:
-            await future
-        except OperationTimeoutError:
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if any(isinstance(error, OperationTimeoutError) for error in errors):
             code = _ConnectingCode.UNSUBSCRIBE_ERROR
             await self._disconnect(_code_number(code), _code_message(code), True)
             return
+        if errors:
+            raise errors[0]
 
-    def _register_future(self, cmd_id: int, timeout: float) -> asyncio.Future:
-        future = asyncio.Future()
-
-        th = None
-        if timeout:
+    def _queue_command(self, cmd_id: int, command: Any, timeout: float) -> asyncio.Future:
+        """Encodes command, registers a future for its reply and puts the command to the
+        write queue. Encoding errors are raised to the caller before the future is registered.
+        """
+        data = self._codec.encode_command(command)
+        future = self._register_future(cmd_id, timeout)
+        self._put_command(cmd_id, data)
+        return future
 
-            def cb():
-                if not future.done():
-                    self._future_error(cmd_id, OperationTimeoutError())
+    def _put_command(self, cmd_id: int, data: Any) -> None:
+        """Puts encoded command to the write queue of current connection. If client is not
+        connected the command is not sent, and its future is failed right away.
+        """
+        if self.state != ClientState.CONNECTED:
+            self._future_error(
+                cmd_id,
+                ClientDisconnectedError(f"command {cmd_id} canceled, client is not connected"),
+            )
+            return
+        self._write_queue.put_nowait((cmd_id, data))
 
-            th = self._loop.call_later(timeout, cb)
+    def _register_future(self, cmd_id: int, timeout: float) -> asyncio.Future:
+        future = self._loop.create_future()
+        if timeout:
+            self._schedule_timeout(cmd_id, timeout)
 
         self._futures[cmd_id] = _Callback(
             future=future,
             done=None,
-            timeout=th,
         )
 
         return future
@@ -702,76 +778,95 @@ class Client:
         async pushes coming from the server. This way we can be sure that publications
         processed in order by the application.
         """
-        future = asyncio.Future()
-        done = asyncio.Future()
-
-        th = None
+        future = self._loop.create_future()
+        done = self._loop.create_future()
         if timeout:
+            self._schedule_timeout(cmd_id, timeout)
 
-            def cb():
-                if not future.done():
-                    self._future_error(cmd_id, OperationTimeoutError())
-
-            th = self._loop.call_later(timeout, cb)
-
-        cb = _Callback(
+        self._futures[cmd_id] = _Callback(
             future=future,
             done=done,
-            timeout=th,
         )
 
-        self._futures[cmd_id] = cb
-
         try:
             yield future
         finally:
-            done.set_result(True)
+            if not done.done():
+                done.set_result(True)
+
+    def _schedule_timeout(self, cmd_id: int, timeout: float) -> None:
+        """Puts command deadline to a timing wheel slot. A single ticker walks the wheel
+        while there are commands waiting for reply, so adding a deadline is O(1) and
+        replies do not need to cancel anything - deadlines of commands which already got
+        a reply are skipped when their slot is visited.
+        """
+        now = self._loop.time()
+        deadline = now + timeout
+        tick = int(deadline / self._timeout_resolution)
+        self._timeout_wheel[tick % self._timeout_wheel_size].append((deadline, cmd_id))
+        if self._timeout_timer is None:
+            self._timeout_tick = int(now / self._timeout_resolution) - 1
+            self._arm_timeout_ticker()
+
+    def _arm_timeout_ticker(self) -> None:
+        # Ticker fires on slot boundaries, so a command times out at most one slot late.
+        next_tick = self._timeout_tick + 2
+        self._timeout_timer = self._loop.call_at(
+            next_tick * self._timeout_resolution,
+            self._on_timeout_tick,
+        )
+
+    def _on_timeout_tick(self) -> None:
+        self._timeout_timer = None
+        if not self._futures:
+            # Everything left in the wheel belongs to commands which already got a reply.
+            self._clear_timeouts()
+            return
+        now = self._loop.time()
+        # Slots up to the current one (exclusive) are fully elapsed.
+        current_tick = int(now / self._timeout_resolution)
+        first_tick = max(self._timeout_tick + 1, current_tick - self._timeout_wheel_size)
+        wheel = self._timeout_wheel
+        try:
+            for tick in range(first_tick, current_tick):
+                slot = tick % self._timeout_wheel_size
+                entries = wheel[slot]
+                if not entries:
+                    continue
+                # Entries of later wheel rotations stay in the slot.
+                wheel[slot] = [entry for entry in entries if entry[0] > now]
+                for deadline, cmd_id in entries:
+                    if deadline <= now:
+                        self._future_error(cmd_id, OperationTimeoutError())
+        finally:
+            self._timeout_tick = max(self._timeout_tick, current_tick - 1)
+            self._arm_timeout_ticker()
+
+    def _clear_timeouts(self) -> None:
+        for entries in self._timeout_wheel:
+            entries.clear()
+        if self._timeout_timer:
+            self._timeout_timer.cancel()
+            self._timeout_timer = None
 
     def _future_error(self, cmd_id: int, exc: Exception):
-        cb = self._futures.get(cmd_id)
+        cb = self._futures.pop(cmd_id, None)
         if not cb:
             return
-        cb.future.set_exception(exc)
-        if cb.done:
+        if not cb.future.done():
+            cb.future.set_exception(exc)
+        if cb.done and not cb.done.done():
             cb.done.set_result(True)
-        del self._futures[cmd_id]
 
     async def _future_success(self, cmd_id: int, reply):
-        cb = self._futures.get(cmd_id)
+        cb = self._futures.pop(cmd_id, None)
         if not cb:
             return
-        future = cb.future
-        future.set_result(reply)
-        del self._futures[cmd_id]
-        if cb.timeout:
-            cb.timeout.cancel()
+        if not cb.future.done():
+            cb.future.set_result(reply)
         if cb.done:
             await cb.done
 
-    def _decode_data(self, data: BytesOrJSON):
-        if data is None:
-            return None
-        if self._use_protobuf:
-            if isinstance(data, str):
-                return base64.b64decode(data)
-            return data
-        else:
-            return data
-
-    def _encode_data(self, data: BytesOrJSON):
-        if self._use_protobuf:
-            if not isinstance(data, bytes):
-                raise CentrifugeError(
-                    "when using Protobuf protocol you must encode payloads to bytes",
-                )
-            return base64.b64encode(data)
-        else:
-            if isinstance(data, bytes):
-                raise CentrifugeError(
-                    "when using JSON protocol you can not encode payloads to bytes",
-                )
-            return data
-
     @staticmethod
     def _check_reply_error(reply) -> None:
         if reply.get("error"):
@@ -779,12 +874,13 @@ class Client:
             raise ReplyError(error["code"], error["message"], error.get("temporary", False))
 
     async def ready(self, timeout: Optional[float] = None) -> None:
-        completed = await _wait_for_future(
-            self._connected_future,
-            timeout=timeout or self._timeout,
-        )
-        if not completed:
-            raise OperationTimeoutError("timeout waiting for connection to be ready")
+        try:
+            await asyncio.wait_for(self._connected_event.wait(), timeout or self._timeout)
+        except asyncio.TimeoutError:
+            raise OperationTimeoutError("timeout waiting for connection to be ready") from None
+        # Event is also set on terminal disconnect to wake up waiters.
+        if self.state == ClientState.DISCONNECTED:
+            raise ClientDisconnectedError("client disconnected")
 
     async def publish(
         self,
@@ -795,15 +891,8 @@ class Client:
         await self.ready()
 
         cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "publish": {
-                "channel": channel,
-                "data": self._encode_data(data),
-            },
-        }
-        future = self._register_future(cmd_id, timeout or self._timeout)
-        await self._send_commands([command])
+        command = self._codec.publish_command(cmd_id, channel, self._encode_data(data))
+        future = self._queue_command(cmd_id, command, timeout or self._timeout)
         reply = await future
         self._check_reply_error(reply)
         return PublishResult()
@@ -818,42 +907,23 @@ class Client:
     ) -> HistoryResult:
         await self.ready()
 
-        history = {
-            "channel": channel,
-            "limit": limit,
-            "reverse": reverse,
-        }
-        if since:
-            history["since"] = {
-                "offset": since.offset,
-                "epoch": since.epoch,
-            }
-
         cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "history": history,
-        }
-        future = self._register_future(cmd_id, timeout or self._timeout)
-        await self._send_commands([command])
+        command = self._codec.history_command(cmd_id, channel, limit, since, reverse)
+        future = self._queue_command(cmd_id, command, timeout or self._timeout)
         reply = await future
         self._check_reply_error(reply)
 
-        publications = []
-        for pub in reply["history"].get("publications", []):
-            info = pub.get("info", None)
-            client_info = self._extract_client_info(info) if info else None
-            publications.append(
-                Publication(
-                    offset=pub.get("offset", 0),
-                    data=self._decode_data(pub.get("data")),
-                    info=client_info,
-                ),
-            )
+        history = reply["history"]
+        decode_data = self._decode_data
+        extract_client_info = self._extract_client_info
+        publications = [
+            _build_publication(pub, decode_data, extract_client_info)
+            for pub in history.get("publications", [])
+        ]
 
         return HistoryResult(
-            epoch=reply["history"].get("epoch", ""),
-            offset=reply["history"].get("offset", 0),
+            epoch=history.get("epoch", ""),
+            offset=history.get("offset", 0),
             publications=publications,
         )
 
@@ -861,25 +931,15 @@ class Client:
         await self.ready()
 
         cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "presence": {
-                "channel": channel,
-            },
-        }
-        future = self._register_future(cmd_id, timeout or self._timeout)
-        await self._send_commands([command])
+        command = self._codec.presence_command(cmd_id, channel)
+        future = self._queue_command(cmd_id, command, timeout or self._timeout)
         reply = await future
         self._check_reply_error(reply)
 
-        clients = {}
-        for k, v in reply["presence"].get("presence", {}).items():
-            clients[k] = ClientInfo(
-                client=v.get("client", ""),
-                user=v.get("user", ""),
-                conn_info=self._decode_data(v.get("conn_info", None)),
-                chan_info=self._decode_data(v.get("chan_info", None)),
-            )
+        extract_client_info = self._extract_client_info
+        clients = {
+            k: extract_client_info(v) for k, v in reply["presence"].get("presence", {}).items()
+        }
 
         return PresenceResult(
             clients=clients,
@@ -893,19 +953,14 @@ class Client:
         await self.ready()
 
         cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "presence_stats": {
-                "channel": channel,
-            },
-        }
-        future = self._register_future(cmd_id, timeout or self._timeout)
-        await self._send_commands([command])
+        command = self._codec.presence_stats_command(cmd_id, channel)
+        future = self._queue_command(cmd_id, command, timeout or self._timeout)
         reply = await future
         self._check_reply_error(reply)
+        stats = reply["presence_stats"]
         return PresenceStatsResult(
-            num_clients=reply["presence_stats"].get("num_clients", 0),
-            num_users=reply["presence_stats"].get("num_users", 0),
+            num_clients=stats.get("num_clients", 0),
+            num_users=stats.get("num_users", 0),
         )
 
     async def rpc(
@@ -917,15 +972,8 @@ class Client:
         await self.ready()
 
         cmd_id = self._next_command_id()
-        command = {
-            "id": cmd_id,
-            "rpc": {
-                "method": method,
-                "data": self._encode_data(data),
-            },
-        }
-        future = self._register_future(cmd_id, timeout or self._timeout)
-        await self._send_commands([command])
+        command = self._codec.rpc_command(cmd_id, method, self._encode_data(data))
+        future = self._queue_command(cmd_id, command, timeout or self._timeout)
         reply = await future
         self._check_reply_error(reply)
         return RpcResult(
@@ -933,14 +981,15 @@ class Client:
         )
 
     def _clear_outgoing_futures(self) -> None:
-        command_ids = []
-        for cmd_id in self._futures:
-            command_ids.append(cmd_id)
-        for cmd_id in command_ids:
-            self._future_error(
-                cmd_id,
-                ClientDisconnectedError(f"command {cmd_id} canceled due to disconnect"),
-            )
+        futures, self._futures = self._futures, {}
+        for cmd_id, cb in futures.items():
+            if not cb.future.done():
+                cb.future.set_exception(
+                    ClientDisconnectedError(f"command {cmd_id} canceled due to disconnect"),
+                )
+            if cb.done and not cb.done.done():
+                cb.done.set_result(True)
+        self._clear_timeouts()
 
     async def _disconnect(self, code: int, reason: str, reconnect: bool) -> None:
         if self._ping_timer:
@@ -955,40 +1004,38 @@ class Client:
 
         self._clear_connecting_state()
 
-        await self._messages.put(None)
-        self._messages = asyncio.Queue()
-
         if not reconnect:
             self._need_reconnect = False
 
         if self.state == ClientState.DISCONNECTED:
             return
 
+        self._stop_writer()
         self._clear_outgoing_futures()
 
-        if self._connected_future.done():
-            self._connected_future = asyncio.Future()
-
         if reconnect:
+            self._connected_event.clear()
             self.state = ClientState.CONNECTING
         else:
-            self._connected_future.set_exception(
-                ClientDisconnectedError(f"client disconnected: {code} ({reason})"),
-            )
-            await self._consume_connected_future()
+            # Wake up ready() waiters, client won't connect until connect() called again.
+            self._connected_event.set()
             self.state = ClientState.DISCONNECTED
 
         if self._conn and self._conn.state != State.CLOSED:
             await self._close_transport_conn()
 
-        for sub in self._subs.values():
-            if sub.state == SubscriptionState.SUBSCRIBED:
-                unsubscribe_code = _SubscribingCode.TRANSPORT_CLOSED
-                await sub.move_subscribing(
-                    code=_code_number(unsubscribe_code),
-                    reason=_code_message(unsubscribe_code),
-                    skip_schedule_resubscribe=True,
-                )
+        subs = list(self._subscribed_subs.values())
+        if subs:
+            await asyncio.gather(
+                *[
+                    sub.move_subscribing(
+                        code=_SUB_TRANSPORT_CLOSED_NUM,
+                        reason=_SUB_TRANSPORT_CLOSED_MSG,
+                        skip_schedule_resubscribe=True,
+                    )
+                    for sub in subs
+                ],
+            )
 
         handler = self._events.on_disconnected
         await handler(DisconnectedContext(code=code, reason=reason))
@@ -996,10 +1043,6 @@ class Client:
         if reconnect:
             asyncio.ensure_future(self._schedule_reconnect())
 
-    async def _consume_connected_future(self) -> None:
-        with contextlib.suppress(CentrifugeError):
-            await self._connected_future
-
     async def _no_ping(self) -> None:
         code = _ConnectingCode.NO_PING
         await self._disconnect(_code_number(code), _code_message(code), True)
@@ -1007,85 +1050,112 @@ class Client:
     def _restart_ping_wait(self) -> None:
         if self._ping_timer:
             self._ping_timer.cancel()
-        self._ping_timer = self._loop.call_later(
-            self._ping_interval + self._max_server_ping_delay,
-            lambda: asyncio.ensure_future(self._no_ping(), loop=self._loop),
-        )
+        self._ping_timer = self._loop.call_later(self._ping_wait_delay, self._launch_no_ping)
+
+    def _launch_no_ping(self) -> None:
+        self._loop.create_task(self._no_ping())
 
     async def _handle_ping(self) -> None:
         logger.debug("received ping from server")
         if self._send_pong:
             logger.debug("respond with pong")
-            await self._send_commands([{}])
+            # Pong goes through the write queue to be coalesced with pending commands.
+            self._write_queue.put_nowait((0, self._codec.pong_command))
         self._restart_ping_wait()
 
-    async def _send_commands(
-        self,
-        commands: Union[List[Dict[str, Any]]],
-    ) -> None:
+    async def _writer_loop(self, queue: asyncio.Queue) -> None:
+        """Sends commands put to the write queue of current connection. Commands which
+        accumulated in the queue while previous send was in progress are sent together
+        in one WebSocket frame.
+        """
+        logger.debug("start writer routine")
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self._max_batch_size:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._send_commands(batch)
+            except Exception as e:
+                # Only commands of this batch fail, writer keeps serving the connection.
+                # Each future gets its own error, as traceback of e holds writer's frame.
+                logger.exception("error sending commands")
+                for cmd_id, _ in batch:
+                    self._future_error(cmd_id, CentrifugeError(f"error sending command: {e!r}"))
+        logger.debug("stop writer routine")
+
+    def _stop_writer(self) -> None:
+        # Commands left in the queue are dropped, their futures are failed on disconnect.
+        queue = self._write_queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _send_commands(self, batch: List[Tuple[int, Any]]) -> None:
+        """Sends a batch of (command id, encoded command) pairs in one WebSocket frame."""
         if self._conn is None:
             raise CentrifugeError("connection is not initialized")
-        logger.debug("send commands: %s", str(commands))
-        commands = self._codec.encode_commands(commands)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("send commands: %s", [data for _, data in batch])
+        data = self._codec.join_commands([data for _, data in batch])
         try:
-            await self._conn.send(commands)
+            await self._conn.send(data)
         except exceptions.ConnectionClosed:
-            code = _ConnectingCode.TRANSPORT_CLOSED
-            await self._disconnect(_code_number(code), _code_message(code), True)
+            await self._disconnect(_TRANSPORT_CLOSED_NUM, _TRANSPORT_CLOSED_MSG, True)
 
     async def _process_unsubscribe(self, channel: str, unsubscribe: Dict[str, Any]) -> None:
         sub = self._subs.get(channel, None)
         if not sub:
             return
 
-        code = unsubscribe["code"]
+        code, reason = _get_code_reason(unsubscribe)
         if code < 2500:
-            asyncio.ensure_future(sub._move_unsubscribed(code, unsubscribe["reason"]))
+            asyncio.ensure_future(sub._move_unsubscribed(code, reason))
         else:
-            asyncio.ensure_future(sub.move_subscribing(code, unsubscribe["reason"]))
+            asyncio.ensure_future(sub.move_subscribing(code, reason))
 
     async def _process_disconnect(self, disconnect: Dict[str, Any]) -> None:
         logger.debug("disconnect push received")
-        code = disconnect["code"]
-        reconnect = (3500 <= code < 4000) or (4500 <= code < 5000)
-        await self._disconnect(code, disconnect["reason"], reconnect)
+        code, reason = _get_code_reason(disconnect)
+        await self._disconnect(code, reason, _should_reconnect(code))
 
     async def _process_reply(self, reply: Dict[str, Any]) -> None:
-        if reply.get("id", 0) > 0:
-            await self._future_success(reply["id"], reply)
-        elif reply.get("push"):
-            logger.debug("received push reply %s", str(reply))
-            push = reply["push"]
-            if "pub" in push:
-                await self._process_publication(push["channel"], push["pub"])
-            elif "join" in push:
-                await self._process_join(push["channel"], push["join"])
-            elif "leave" in push:
-                await self._process_leave(push["channel"], push["leave"])
-            elif "unsubscribe" in push:
-                await self._process_unsubscribe(push["channel"], push["unsubscribe"])
-            elif "disconnect" in push:
-                await self._process_disconnect(push["disconnect"])
-            else:
-                logger.debug("skip unknown push reply %s", str(reply))
-        else:
+        reply_id = reply.get("id")
+        if reply_id:
+            await self._future_success(reply_id, reply)
+            return
+
+        push = reply.get("push")
+        if not push:
             await self._handle_ping()
+            return
+
+        logger.debug("received push reply %s", reply)
+        # Push carries the channel and exactly one push type field.
+        push_handlers = self._push_handlers
+        for key, value in push.items():
+            handler = push_handlers.get(key)
+            if handler is not None:
+                await handler(push["channel"], value)
+                return
+            if key == "disconnect":
+                await self._process_disconnect(value)
+                return
+        logger.debug("skip unknown push reply %s", reply)
 
     async def _process_publication(self, channel: str, pub: Any) -> None:
         sub = self._subs.get(channel, None)
         if not sub:
             return
 
-        info = pub.get("info", None)
-        client_info = self._extract_client_info(info) if info else None
-
         await sub._events.on_publication(
             PublicationContext(
-                pub=Publication(
-                    offset=pub.get("offset", 0),
-                    data=self._decode_data(pub.get("data")),
-                    info=client_info,
-                ),
+                pub=_build_publication(pub, self._decode_data, self._extract_client_info),
             ),
         )
 
@@ -1106,72 +1176,62 @@ class Client:
         await sub._events.on_leave(LeaveContext(info=client_info))
 
     def _extract_client_info(self, info: Any) -> ClientInfo:
+        info_get = info.get
+        conn_info = info_get("conn_info")
+        if conn_info is not None:
+            conn_info = self._decode_data(conn_info)
+        chan_info = info_get("chan_info")
+        if chan_info is not None:
+            chan_info = self._decode_data(chan_info)
         return ClientInfo(
-            client=info.get("client", ""),
-            user=info.get("user", ""),
-            conn_info=self._decode_data(info.get("conn_info", None)),
-            chan_info=self._decode_data(info.get("chan_info", None)),
+            client=info_get("client", ""),
+            user=info_get("user", ""),
+            conn_info=conn_info,
+            chan_info=chan_info,
         )
 
     async def _process_incoming_data(self, message: bytes) -> None:
-        logger.debug("start parsing message: %s", str(message))
-        replies = self._codec.decode_replies(message)
-        logger.debug("got %d replies", len(replies))
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("start parsing message: %s", message)
+        if self._codec.decode_in_executor and len(message) > self._decode_in_executor_size:
+            replies = await self._loop.run_in_executor(None, self._codec.decode_replies, message)
+        else:
+            replies = self._codec.decode_replies(message)
+        if debug:
+            logger.debug("got %d replies", len(replies))
         for reply in replies:
-            logger.debug("got reply %s", str(reply))
+            if debug:
+                logger.debug("got reply %s", reply)
             await self._process_reply(reply)
 
-    async def _process_messages(self) -> None:
-        logger.debug("start message processing routine")
-        while True:
-            if self._messages:
-                message = await self._messages.get()
-                if message is None:
-                    break
-                logger.debug("start processing message: %s", str(message))
-                await self._process_incoming_data(message)
-        logger.debug("stop message processing routine")
-
     async def _listen(self) -> None:
         logger.debug("start reading connection")
-        if self._conn is None:
+        conn = self._conn
+        if conn is None:
             raise CentrifugeError("connection is not initialized")
 
-        while self._conn.open:
+        process_incoming_data = self._process_incoming_data
+        while conn.open:
             try:
-                result = await self._conn.recv()
+                result = await conn.recv()
                 if result:
                     logger.debug("data received %s", result)
-                    await self._messages.put(result)
+                    await process_incoming_data(result)
             except exceptions.ConnectionClosed:
                 break
 
         logger.debug("stop reading connection")
 
-        ws_code = self._conn.close_code
-        ws_reason = self._conn.close_reason
+        ws_code = conn.close_code
+        ws_reason = conn.close_reason
         if not ws_code:
             ws_code = 0
             ws_reason = ""
         logger.debug("connection closed, code: %d, reason: %s", ws_code, ws_reason)
 
-        default_code = _ConnectingCode.TRANSPORT_CLOSED
-        disconnect_code = _code_number(default_code)
-        disconnect_reason = _code_message(default_code)
-        reconnect = True
-
-        if ws_code < 3000:
-            if ws_code == 1009:
-                code = _DisconnectedCode.MESSAGE_SIZE_LIMIT
-                disconnect_code = _code_number(code)
-                disconnect_reason = _code_message(code)
-        else:
-            disconnect_code = ws_code
-            disconnect_reason = ws_reason
-            if (3500 <= ws_code < 4000) or (4500 <= ws_code < 5000):
-                reconnect = False
-
-        await self._disconnect(disconnect_code, disconnect_reason, reconnect)
+        code, reason, reconnect = _close_code_to_disconnect(ws_code, ws_reason)
+        await self._disconnect(code, reason, reconnect)
 
 
 class Subscription:
@@ -1215,8 +1275,8 @@ class Subscription:
         self.state = SubscriptionState.UNSUBSCRIBED
         # Optimistically keep future unresolved for newly created instance
         # despite Subscription is in UNSUBSCRIBED state.
-        self._subscribed_future: asyncio.Future[bool] = asyncio.Future()
-        self._subscribed = False
+        self._loop = client._loop
+        self._subscribed_future: asyncio.Future[bool] = self._loop.create_future()
         self._client = client
         self._events = events or SubscriptionEventHandler()
         self._token = token
@@ -1234,11 +1294,12 @@ class Subscription:
         return obj
 
     async def ready(self, timeout: Optional[float] = None) -> None:
-        completed = await _wait_for_future(
-            self._subscribed_future,
+        # asyncio.wait neither cancels the future on timeout nor raises its exception.
+        done, _ = await asyncio.wait(
+            (self._subscribed_future,),
             timeout=timeout or self._client._timeout,
         )
-        if not completed:
+        if not done:
             raise OperationTimeoutError("timeout waiting for subscription to be ready")
 
     async def history(
@@ -1293,6 +1354,7 @@ class Subscription:
         )
 
     def _clear_subscribed_state(self) -> None:
+        self._client._subscribed_subs.pop(self.channel, None)
         if self._refresh_timer:
             logger.debug("canceling refresh timer for %s", self.channel)
             self._refresh_timer.cancel()
@@ -1322,7 +1384,7 @@ class Subscription:
         self.state = SubscriptionState.UNSUBSCRIBED
 
         if self._subscribed_future.done():
-            self._subscribed_future = asyncio.Future()
+            self._subscribed_future = self._loop.create_future()
         self._subscribed_future.set_exception(
             SubscriptionUnsubscribedError("subscription unsubscribed"),
         )
@@ -1358,7 +1420,7 @@ class Subscription:
 
         self.state = SubscriptionState.SUBSCRIBING
         if self._subscribed_future.done():
-            self._subscribed_future = asyncio.Future()
+            self._subscribed_future = self._loop.create_future()
 
         handler = self._events.on_subscribing
         await handler(
@@ -1373,6 +1435,7 @@ class Subscription:
 
     async def _move_subscribed(self, subscribe: Dict[str, Any]) -> None:
         self.state = SubscriptionState.SUBSCRIBED
+        self._client._subscribed_subs[self.channel] = self
         self._subscribed_future.set_result(True)
         on_subscribed_handler = self._events.on_subscribed
         recoverable = subscribe.get("recoverable", False)
@@ -1387,10 +1450,7 @@ class Subscription:
         expires = subscribe.get("expires", False)
         if expires:
             ttl = subscribe["ttl"]
-            self._refresh_timer = self._client._loop.call_later(
-                ttl,
-                lambda: asyncio.ensure_future(self._refresh(), loop=self._client._loop),
-            )
+            self._refresh_timer = self._loop.call_later(ttl, self._launch_refresh)
 
         await on_subscribed_handler(
             SubscribedContext(
@@ -1407,21 +1467,20 @@ class Subscription:
         publications = subscribe.get("publications", [])
         if publications:
             on_publication_handler = self._events.on_publication
+            decode_data = self._client._decode_data
+            extract_client_info = self._client._extract_client_info
             for pub in publications:
-                info = pub.get("info", None)
-                client_info = self._client._extract_client_info(info) if info else None
                 await on_publication_handler(
                     PublicationContext(
-                        pub=Publication(
-                            offset=pub.get("offset", 0),
-                            data=self._client._decode_data(pub.get("data")),
-                            info=client_info,
-                        ),
+                        pub=_build_publication(pub, decode_data, extract_client_info),
                     ),
                 )
 
         self._clear_subscribing_state()
 
+    def _launch_refresh(self) -> None:
+        self._loop.create_task(self._refresh())
+
     async def _refresh(self) -> None:
         if self.state != SubscriptionState.SUBSCRIBED:
             return
@@ -1438,10 +1497,10 @@ class Subscription:
         )
         self._resubscribe_attempts += 1
         logger.debug("start resubscribing in %f", delay)
-        self._resubscribe_timer = self._client._loop.call_later(
-            delay,
-            lambda: asyncio.ensure_future(self._resubscribe()),
-        )
+        self._resubscribe_timer = self._loop.call_later(delay, self._launch_resubscribe)
+
+    def _launch_resubscribe(self) -> None:
+        self._loop.create_task(self._resubscribe())
 
     async def _resubscribe(self) -> None:
         if self.state != SubscriptionState.SUBSCRIBING:
@@ -1,22 +1,129 @@
+import base64
 import json
-from typing import Union, Iterable, AsyncIterable
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from google.protobuf.json_format import MessageToDict, ParseDict
-from websockets.typing import Data
 
 import centrifuge.protocol.client_pb2 as protocol
+from centrifuge.exceptions import CentrifugeError
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if TYPE_CHECKING:
+    from centrifuge.types import BytesOrJSON, StreamPosition
+
+_stdlib_json_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+# JSON backend is chosen at import time: orjson when installed, stdlib json otherwise.
+if orjson is not None:
+
+    def _json_dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson rejects some values stdlib json encodes (e.g. integers wider
+            # than 64 bits), keep such payloads working regardless of installed extras.
+            return _stdlib_json_dumps(obj)
+
+    _json_loads = orjson.loads
+else:
+    _json_dumps = _stdlib_json_dumps
+    _json_loads = json.loads
 
 
 class _JsonCodec:
     """_JsonCodec is a default codec for Centrifuge library. It encodes commands using JSON."""
 
+    subprotocols = ()
+    # Pong is an empty command, keep it encoded.
+    pong_command = "{}"
+    # JSON decoders hold the GIL for the whole decode, a thread would not unblock the loop.
+    decode_in_executor = False
+
     @staticmethod
-    def encode_commands(commands):
-        return "\n".join(json.dumps(command) for command in commands)
+    def encode_data(data: "BytesOrJSON"):
+        if isinstance(data, bytes):
+            raise CentrifugeError(
+                "when using JSON protocol you can not encode payloads to bytes",
+            )
+        return data
+
+    @staticmethod
+    def decode_data(data: "BytesOrJSON"):
+        return data
+
+    @staticmethod
+    def encode_command(command) -> str:
+        # Command builders may return already serialized commands.
+        if isinstance(command, str):
+            return command
+        return _json_dumps(command)
+
+    @staticmethod
+    def join_commands(encoded_commands) -> str:
+        return "\n".join(encoded_commands)
 
     @staticmethod
     def decode_replies(data):
-        return [json.loads(reply) for reply in data.strip().split("\n")]
+        return [_json_loads(reply) for reply in data.strip().split("\n")]
+
+    @staticmethod
+    def publish_command(cmd_id: int, channel: str, data: "BytesOrJSON") -> str:
+        # Publish and RPC are the most frequent commands, serialize them without
+        # building intermediate dicts.
+        return '{"id":%d,"publish":{"channel":%s,"data":%s}}' % (
+            cmd_id,
+            _json_dumps(channel),
+            _json_dumps(data),
+        )
+
+    @staticmethod
+    def rpc_command(cmd_id: int, method: str, data: "BytesOrJSON") -> str:
+        return '{"id":%d,"rpc":{"method":%s,"data":%s}}' % (
+            cmd_id,
+            _json_dumps(method),
+            _json_dumps(data),
+        )
+
+    @staticmethod
+    def history_command(
+        cmd_id: int,
+        channel: str,
+        limit: int,
+        since: Optional["StreamPosition"],
+        reverse: bool,
+    ) -> Dict[str, Any]:
+        history = {"channel": channel, "limit": limit, "reverse": reverse}
+        if since:
+            history["since"] = {"offset": since.offset, "epoch": since.epoch}
+        return {"id": cmd_id, "history": history}
+
+    @staticmethod
+    def presence_command(cmd_id: int, channel: str) -> Dict[str, Any]:
+        return {"id": cmd_id, "presence": {"channel": channel}}
+
+    @staticmethod
+    def presence_stats_command(cmd_id: int, channel: str) -> Dict[str, Any]:
+        return {"id": cmd_id, "presence_stats": {"channel": channel}}
+
+    @staticmethod
+    def subscribe_command(cmd_id: int, channel: str, token: str) -> Dict[str, Any]:
+        return {"id": cmd_id, "subscribe": {"channel": channel, "token": token}}
+
+    @staticmethod
+    def unsubscribe_command(cmd_id: int, channel: str) -> Dict[str, Any]:
+        return {"id": cmd_id, "unsubscribe": {"channel": channel}}
+
+    @staticmethod
+    def refresh_command(cmd_id: int, token: str) -> Dict[str, Any]:
+        return {"id": cmd_id, "refresh": {"token": token}}
+
+    @staticmethod
+    def sub_refresh_command(cmd_id: int, channel: str, token: str) -> Dict[str, Any]:
+        return {"id": cmd_id, "sub_refresh": {"channel": channel, "token": token}}
 
 
 def _varint_encode(number):
@@ -48,16 +155,43 @@ def _varint_decode(buffer: bytes, position: int):
 
 
 class _ProtobufCodec:
-    """_ProtobufCodec encodes commands using Protobuf protocol."""
+    """_ProtobufCodec encodes commands using Protobuf protocol. Command builders construct
+    protocol messages directly, plain dict commands are still accepted by encode_command.
+    """
+
+    subprotocols = ("centrifuge-protobuf",)
+    # Pong is an empty command, encoded it is just a zero length prefix.
+    pong_command = _varint_encode(0)
+    # Converting messages to dicts is pure Python, it can run in a thread to keep
+    # the event loop responsive while large frames are decoded.
+    decode_in_executor = True
+
+    @staticmethod
+    def encode_data(data: "BytesOrJSON"):
+        if not isinstance(data, bytes):
+            raise CentrifugeError(
+                "when using Protobuf protocol you must encode payloads to bytes",
+            )
+        return data
+
+    @staticmethod
+    def decode_data(data: "BytesOrJSON"):
+        if isinstance(data, str):
+            return base64.b64decode(data)
+        return data
 
     @staticmethod
-    def encode_commands(commands: Union[Data, Iterable[Data], AsyncIterable[Data]]):
-        serialized_commands = []
-        for command in commands:
+    def encode_command(command) -> bytes:
+        message = command
+        if not isinstance(message, protocol.Command):
             # noinspection PyUnresolvedReferences
-            serialized = ParseDict(command, protocol.Command()).SerializeToString()
-            serialized_commands.append(_varint_encode(len(serialized)) + serialized)
-        return b"".join(serialized_commands)
+            message = ParseDict(command, protocol.Command())
+        serialized = message.SerializeToString()
+        return _varint_encode(len(serialized)) + serialized
+
+    @staticmethod
+    def join_commands(encoded_commands) -> bytes:
+        return b"".join(encoded_commands)
 
     @staticmethod
     def decode_replies(data: bytes):
@@ -73,3 +207,70 @@ class _ProtobufCodec:
             reply.ParseFromString(message_bytes)
             replies.append(MessageToDict(reply, preserving_proto_field_name=True))
         return replies
+
+    @staticmethod
+    def publish_command(cmd_id: int, channel: str, data: bytes) -> protocol.Command:
+        return protocol.Command(
+            id=cmd_id,
+            publish=protocol.PublishRequest(channel=channel, data=data),
+        )
+
+    @staticmethod
+    def rpc_command(cmd_id: int, method: str, data: bytes) -> protocol.Command:
+        return protocol.Command(id=cmd_id, rpc=protocol.RPCRequest(method=method, data=data))
+
+    @staticmethod
+    def history_command(
+        cmd_id: int,
+        channel: str,
+        limit: int,
+        since: Optional["StreamPosition"],
+        reverse: bool,
+    ) -> protocol.Command:
+        return protocol.Command(
+            id=cmd_id,
+            history=protocol.HistoryRequest(
+                channel=channel,
+                limit=limit,
+                since=protocol.StreamPosition(offset=since.offset, epoch=since.epoch)
+                if since
+                else None,
+                reverse=reverse,
+            ),
+        )
+
+    @staticmethod
+    def presence_command(cmd_id: int, channel: str) -> protocol.Command:
+        return protocol.Command(id=cmd_id, presence=protocol.PresenceRequest(channel=channel))
+
+    @staticmethod
+    def presence_stats_command(cmd_id: int, channel: str) -> protocol.Command:
+        return protocol.Command(
+            id=cmd_id,
+            presence_stats=protocol.PresenceStatsRequest(channel=channel),
+        )
+
+    @staticmethod
+    def subscribe_command(cmd_id: int, channel: str, token: str) -> protocol.Command:
+        return protocol.Command(
+            id=cmd_id,
+            subscribe=protocol.SubscribeRequest(channel=channel, token=token),
+        )
+
+    @staticmethod
+    def unsubscribe_command(cmd_id: int, channel: str) -> protocol.Command:
+        return protocol.Command(
+            id=cmd_id,
+            unsubscribe=protocol.UnsubscribeRequest(channel=channel),
+        )
+
+    @staticmethod
+    def refresh_command(cmd_id: int, token: str) -> protocol.Command:
+        return protocol.Command(id=cmd_id, refresh=protocol.RefreshRequest(token=token))
+
+    @staticmethod
+    def sub_refresh_command(cmd_id: int, channel: str, token: str) -> protocol.Command:
+        return protocol.Command(
+            id=cmd_id,
+            sub_refresh=protocol.SubRefreshRequest(channel=channel, token=token),
+        )
@@ -149,6 +149,8 @@ class UnsubscribedContext:
 class PublicationContext:
     """PublicationContext is a context passed to on_publication callback."""
 
+    __slots__ = ("pub",)
+
     pub: Publication
 
 
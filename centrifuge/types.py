@@ -6,11 +6,16 @@ JSON = Union[Dict[str, "JSON"], List["JSON"], str, int, float, bool, None]
 # BytesOrJSON type represents objects which may be encoded to JSON or bytes.
 BytesOrJSON = Union[bytes, JSON]
 
+# Types created for every publication, history item or presence entry declare __slots__
+# to avoid per-instance __dict__ (dataclass slots=True requires Python 3.10).
+
 
 @dataclass
 class StreamPosition:
     """StreamPosition represents a position in stream."""
 
+    __slots__ = ("offset", "epoch")
+
     offset: int
     epoch: str
 
@@ -27,6 +32,8 @@ class ClientInfo:
         chan_info: optional channel information (i.e. may be None).
     """
 
+    __slots__ = ("client", "user", "conn_info", "chan_info")
+
     client: str
     user: str
     conn_info: Optional[BytesOrJSON]
@@ -44,6 +51,8 @@ class Publication:
         info: optional client information (i.e. may be None).
     """
 
+    __slots__ = ("offset", "data", "info")
+
     offset: int
     data: BytesOrJSON
     info: Optional[ClientInfo]
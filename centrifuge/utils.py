@@ -1,8 +1,8 @@
-import asyncio
 import random
 from enum import Enum
+from typing import Tuple
 
-from centrifuge.codes import _ErrorCode
+from centrifuge.codes import _ConnectingCode, _DisconnectedCode, _ErrorCode
 
 MAX_STEP = 31
 
@@ -29,24 +29,21 @@ def _is_token_expired(code: int) -> bool:
     return code == _ErrorCode.TOKEN_EXPIRED.value
 
 
-async def _wait_for_future(
-    future: asyncio.Future,
-    timeout: float,
-) -> bool:
-    """asyncio.wait_for() cancels the future if the timeout expires. This function does not."""
-    future_task = asyncio.ensure_future(future)
-    # Create a task that completes after a timeout
-    timeout_task = asyncio.ensure_future(asyncio.sleep(timeout))
-
-    # Wait for either the future to complete or the timeout
-    done, pending = await asyncio.wait(
-        {future_task, timeout_task},
-        return_when=asyncio.FIRST_COMPLETED,
-    )
+def _should_reconnect(code: int) -> bool:
+    """Disconnect codes in 3500-3999 and 4500-4999 ranges are terminal, client must not
+    reconnect after them.
+    """
+    return not (3500 <= code < 4000 or 4500 <= code < 5000)
 
-    # Cancel the timeout task if it's still pending (i.e., the future completed first)
-    if timeout_task in pending:
-        timeout_task.cancel()
 
-    # Check if the future is done
-    return future_task in done
+def _close_code_to_disconnect(ws_code: int, ws_reason: str) -> Tuple[int, str, bool]:
+    """Maps WebSocket close code and reason to disconnect code, reason and whether client
+    should reconnect.
+    """
+    if ws_code >= 3000:
+        return ws_code, ws_reason, _should_reconnect(ws_code)
+    if ws_code == 1009:
+        code = _DisconnectedCode.MESSAGE_SIZE_LIMIT
+        return _code_number(code), _code_message(code), True
+    code = _ConnectingCode.TRANSPORT_CLOSED
+    return _code_number(code), _code_message(code), True
@@ -41,3 +41,21 @@ class TestClient(unittest.IsolatedAsyncioTestCase):
                 await sub.unsubscribe()
                 self.assertTrue(sub.state == SubscriptionState.UNSUBSCRIBED)
                 await client.disconnect()
+
+    async def test_client_unsubscribe_all(self) -> None:
+        for use_protobuf in (False, True):
+            with self.subTest(use_protobuf=use_protobuf):
+                client = Client(
+                    "ws://localhost:8000/connection/websocket",
+                    use_protobuf=use_protobuf,
+                )
+                subs = [client.new_subscription(f"channel{i}") for i in range(3)]
+                await client.connect()
+                for sub in subs:
+                    await sub.subscribe()
+                for sub in subs:
+                    await sub.ready()
+                await client.unsubscribe_all([sub.channel for sub in subs])
+                for sub in subs:
+                    self.assertTrue(sub.state == SubscriptionState.UNSUBSCRIBED)
+                await client.disconnect()
@@ -0,0 +1,162 @@
+import asyncio
+import unittest
+from typing import Optional
+
+from centrifuge import (
+    CentrifugeError,
+    Client,
+    ClientDisconnectedError,
+    ClientState,
+    OperationTimeoutError,
+    SubscriptionState,
+)
+
+
+class _SmallWheelClient(Client):
+    # One wheel rotation takes 40ms, so tests can cover timeouts spanning several rotations.
+    _timeout_wheel_size = 4
+    _timeout_resolution = 0.01
+
+
+class _FlakyConnection:
+    def __init__(self) -> None:
+        self.sent = []
+        self.fail = True
+
+    async def send(self, data) -> None:
+        if self.fail:
+            self.fail = False
+            raise RuntimeError("send failed")
+        self.sent.append(data)
+
+
+class TestCommandTimeouts(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.client = _SmallWheelClient("ws://localhost:8000/connection/websocket")
+        self.errors = []
+        asyncio.get_running_loop().set_exception_handler(
+            lambda _, context: self.errors.append(context),
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.client._clear_outgoing_futures()
+
+    async def _elapsed_until_timeout(
+        self,
+        future: asyncio.Future,
+        start: Optional[float] = None,
+    ) -> float:
+        loop = asyncio.get_running_loop()
+        if start is None:
+            start = loop.time()
+        with self.assertRaises(OperationTimeoutError):
+            await future
+        return loop.time() - start
+
+    async def test_timeouts_expire_across_slots(self) -> None:
+        timeouts = (0.01, 0.015, 0.02, 0.035, 0.05)
+        # Commands time out at most one slot late.
+        slack = self.client._timeout_resolution + 0.005
+        start = asyncio.get_running_loop().time()
+        futures = [
+            self.client._register_future(cmd_id, timeout)
+            for cmd_id, timeout in enumerate(timeouts, start=1)
+        ]
+        pending = self.client._register_future(100, 1.0)
+        elapsed = await asyncio.gather(*(self._elapsed_until_timeout(f, start) for f in futures))
+        for timeout, value in zip(timeouts, elapsed):
+            self.assertGreaterEqual(value, timeout)
+            self.assertLess(value, timeout + slack)
+        self.assertFalse(pending.done())
+        self.assertFalse(self.errors)
+
+    async def test_timeout_longer_than_wheel_rotation(self) -> None:
+        rotation = self.client._timeout_wheel_size * self.client._timeout_resolution
+        start = asyncio.get_running_loop().time()
+        future = self.client._register_future(1, rotation * 3)
+        await asyncio.sleep(rotation * 2)
+        self.assertFalse(future.done())
+        elapsed = await self._elapsed_until_timeout(future, start)
+        self.assertGreaterEqual(elapsed, rotation * 3)
+        self.assertLess(elapsed, rotation * 3 + self.client._timeout_resolution + 0.005)
+
+    async def test_reply_before_timeout(self) -> None:
+        future = self.client._register_future(1, 0.02)
+        await self.client._future_success(1, {"id": 1})
+        self.assertEqual(await future, {"id": 1})
+        await asyncio.sleep(0.05)
+        self.assertFalse(self.errors)
+
+    async def test_cancelled_waiter_does_not_break_ticker(self) -> None:
+        async def wait_reply() -> None:
+            async with self.client._register_future_with_done(1, 0.03) as future:
+                await future
+
+        other = self.client._register_future(2, 0.03)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(wait_reply(), 0.01)
+        # Entry of cancelled waiter expires in the same slot as the other command.
+        await self._elapsed_until_timeout(other)
+        later = self.client._register_future(3, 0.02)
+        await self._elapsed_until_timeout(later)
+        self.assertFalse(self.errors)
+
+
+class TestWriter(unittest.IsolatedAsyncioTestCase):
+    async def test_writer_survives_failed_batch(self) -> None:
+        client = Client("ws://localhost:8000/connection/websocket")
+        conn = _FlakyConnection()
+        client._conn = conn
+        client.state = ClientState.CONNECTED
+        writer = asyncio.ensure_future(client._writer_loop(client._write_queue))
+
+        failed = client._queue_command(1, client._codec.rpc_command(1, "m", {}), 1.0)
+        with self.assertLogs("centrifuge", "ERROR"), self.assertRaises(CentrifugeError):
+            await failed
+
+        sent = client._queue_command(2, client._codec.rpc_command(2, "m", {}), 1.0)
+        while not conn.sent:
+            await asyncio.sleep(0)
+        self.assertEqual(conn.sent, [client._codec.rpc_command(2, "m", {})])
+        await client._future_success(2, {"id": 2})
+        await sent
+
+        client._stop_writer()
+        await asyncio.wait_for(writer, 1.0)
+        client._clear_timeouts()
+
+    async def test_command_not_queued_when_disconnected(self) -> None:
+        client = Client("ws://localhost:8000/connection/websocket")
+        future = client._queue_command(1, client._codec.rpc_command(1, "m", {}), 1.0)
+        with self.assertRaises(ClientDisconnectedError):
+            await future
+        self.assertTrue(client._write_queue.empty())
+        client._clear_timeouts()
+
+
+class TestUnsubscribeAll(unittest.IsolatedAsyncioTestCase):
+    async def test_repeated_channels_unsubscribed_once(self) -> None:
+        client = Client("ws://localhost:8000/connection/websocket")
+        conn = _FlakyConnection()
+        conn.fail = False
+        client._conn = conn
+        client.state = ClientState.CONNECTED
+        writer = asyncio.ensure_future(client._writer_loop(client._write_queue))
+        for channel in ("news", "chat"):
+            client.new_subscription(channel).state = SubscriptionState.SUBSCRIBED
+
+        task = asyncio.ensure_future(client.unsubscribe_all(["news", "chat", "news", "other"]))
+        while not conn.sent:
+            await asyncio.sleep(0)
+        self.assertEqual(len(client._futures), 2)
+        for cmd_id in list(client._futures):
+            await client._future_success(cmd_id, {"id": cmd_id})
+        await task
+        for channel in ("news", "chat"):
+            self.assertEqual(
+                client.get_subscription(channel).state, SubscriptionState.UNSUBSCRIBED
+            )
+
+        client._stop_writer()
+        await asyncio.wait_for(writer, 1.0)
+        client._clear_timeouts()
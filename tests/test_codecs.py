@@ -0,0 +1,136 @@
+import base64
+import json
+import unittest
+from unittest import mock
+
+from google.protobuf.json_format import ParseDict
+
+import centrifuge.protocol.client_pb2 as protocol
+from centrifuge import codecs
+from centrifuge.codecs import _JsonCodec, _ProtobufCodec
+from centrifuge.types import StreamPosition
+
+# Quotes, backslash and non-ASCII characters must survive hand-written JSON templates.
+CHANNEL = 'news:"quoted" \\ канал ✓'
+DATA = {"text": 'say "hi" ✓', "n": [1, 2.5, None, True]}
+
+
+def _json_backends():
+    backends = {"json": json.JSONEncoder(separators=(",", ":")).encode}
+    if codecs.orjson is not None:
+        backends["orjson"] = lambda obj: codecs.orjson.dumps(
+            obj, option=codecs.orjson.OPT_NON_STR_KEYS
+        ).decode()
+    return backends
+
+
+def _command_dicts(token: str, data):
+    """Commands in the shape client built as plain dicts before codec builders appeared."""
+    since = StreamPosition(offset=10, epoch="xyz")
+    return {
+        "publish": (
+            ("publish_command", 1, CHANNEL, data),
+            {"id": 1, "publish": {"channel": CHANNEL, "data": data}},
+        ),
+        "rpc": (
+            ("rpc_command", 2, CHANNEL, data),
+            {"id": 2, "rpc": {"method": CHANNEL, "data": data}},
+        ),
+        "history": (
+            ("history_command", 3, CHANNEL, 10, since, True),
+            {
+                "id": 3,
+                "history": {
+                    "channel": CHANNEL,
+                    "limit": 10,
+                    "reverse": True,
+                    "since": {"offset": 10, "epoch": "xyz"},
+                },
+            },
+        ),
+        "history_no_since": (
+            ("history_command", 4, CHANNEL, 0, None, False),
+            {"id": 4, "history": {"channel": CHANNEL, "limit": 0, "reverse": False}},
+        ),
+        "presence": (
+            ("presence_command", 5, CHANNEL),
+            {"id": 5, "presence": {"channel": CHANNEL}},
+        ),
+        "presence_stats": (
+            ("presence_stats_command", 6, CHANNEL),
+            {"id": 6, "presence_stats": {"channel": CHANNEL}},
+        ),
+        "subscribe": (
+            ("subscribe_command", 7, CHANNEL, token),
+            {"id": 7, "subscribe": {"channel": CHANNEL, "token": token}},
+        ),
+        "unsubscribe": (
+            ("unsubscribe_command", 8, CHANNEL),
+            {"id": 8, "unsubscribe": {"channel": CHANNEL}},
+        ),
+        "refresh": (
+            ("refresh_command", 9, token),
+            {"id": 9, "refresh": {"token": token}},
+        ),
+        # Subscription refresh must carry the channel it refreshes a token for.
+        "sub_refresh": (
+            ("sub_refresh_command", 10, CHANNEL, token),
+            {"id": 10, "sub_refresh": {"channel": CHANNEL, "token": token}},
+        ),
+    }
+
+
+class TestJsonCodec(unittest.TestCase):
+    def test_commands_match_dict_shape(self) -> None:
+        for backend, dumps in _json_backends().items():
+            with mock.patch.object(codecs, "_json_dumps", dumps):
+                for name, (call, expected) in _command_dicts("tok", DATA).items():
+                    with self.subTest(backend=backend, command=name):
+                        method, *args = call
+                        command = getattr(_JsonCodec, method)(*args)
+                        encoded = _JsonCodec.encode_command(command)
+                        self.assertEqual(json.loads(encoded), expected)
+
+    @unittest.skipIf(codecs.orjson is None, "orjson is not installed")
+    def test_orjson_falls_back_to_stdlib(self) -> None:
+        data = {"big": 2**70}
+        command = _JsonCodec.publish_command(1, CHANNEL, data)
+        self.assertEqual(json.loads(command)["publish"]["data"], data)
+
+    def test_join_and_decode(self) -> None:
+        commands = [
+            _JsonCodec.encode_command(_JsonCodec.publish_command(1, CHANNEL, DATA)),
+            _JsonCodec.pong_command,
+        ]
+        joined = _JsonCodec.join_commands(commands)
+        self.assertEqual(
+            _JsonCodec.decode_replies(joined + "\n"),
+            [{"id": 1, "publish": {"channel": CHANNEL, "data": DATA}}, {}],
+        )
+
+
+class TestProtobufCodec(unittest.TestCase):
+    def test_commands_match_parsed_dicts(self) -> None:
+        data = b"\x00\x01binary\xff"
+        for token in ("tok", ""):
+            commands = _command_dicts(token, base64.b64encode(data).decode())
+            for name, (call, expected) in commands.items():
+                with self.subTest(token=token, command=name):
+                    method, *args = call
+                    if method in ("publish_command", "rpc_command"):
+                        args[-1] = data
+                    command = getattr(_ProtobufCodec, method)(*args)
+                    self.assertEqual(
+                        command.SerializeToString(),
+                        ParseDict(expected, protocol.Command()).SerializeToString(),
+                    )
+                    self.assertEqual(
+                        _ProtobufCodec.encode_command(command),
+                        _ProtobufCodec.encode_command(expected),
+                    )
+
+    def test_pong_is_empty_command(self) -> None:
+        self.assertEqual(
+            _ProtobufCodec.pong_command,
+            _ProtobufCodec.encode_command(protocol.Command()),
+        )
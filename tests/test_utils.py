@@ -0,0 +1,24 @@
+import unittest
+
+from centrifuge.utils import _close_code_to_disconnect, _should_reconnect
+
+
+class TestDisconnectCodes(unittest.TestCase):
+    def test_should_reconnect(self) -> None:
+        for code in (0, 1, 3000, 3499, 4000, 4499, 5000):
+            with self.subTest(code=code):
+                self.assertTrue(_should_reconnect(code))
+        for code in (3500, 3501, 3999, 4500, 4999):
+            with self.subTest(code=code):
+                self.assertFalse(_should_reconnect(code))
+
+    def test_close_code_to_disconnect(self) -> None:
+        self.assertEqual(_close_code_to_disconnect(0, ""), (1, "transport closed", True))
+        self.assertEqual(_close_code_to_disconnect(1006, "x"), (1, "transport closed", True))
+        self.assertEqual(
+            _close_code_to_disconnect(1009, ""),
+            (3, "message size limit", True),
+        )
+        self.assertEqual(_close_code_to_disconnect(3000, "again"), (3000, "again", True))
+        self.assertEqual(_close_code_to_disconnect(3501, "bye"), (3501, "bye", False))
+        self.assertEqual(_close_code_to_disconnect(4501, "bye"), (4501, "bye", False))